@@ -0,0 +1,124 @@
+import os
+import random
+import tempfile
+import time
+
+from src.cache import SearchCache
+from src.utils import Board
+
+SIZES = [6, 8, 10, 16]
+# share of the board filled with discs before a position is measured
+PHASES = [('opening', 0.2), ('midgame', 0.5), ('endgame', 0.8)]
+POSITIONS = 10
+SEARCH_DEPTH = 3
+# the computer player's search on the default board, with and without the search cache
+CACHE_SIZE = 8
+CACHE_OPENINGS = 3
+CACHE_OPENING_PLIES = 6
+CACHE_GAME_PLIES = 16
+CACHE_DEPTH = 5
+CACHE_RUNS = 3
+
+def sample_positions(size, count, fill, seed=0):
+    """Returns positions reached by playing random moves until a share of the board is filled"""
+    rng = random.Random(seed)
+    discs = max(4, round(fill * size * size))
+    positions = []
+    while len(positions) < count:
+        board = Board.new_board(size)
+        player = 1
+        while sum(Board.player_scores(board, 1, 2)) < discs:
+            moves = Board.get_valid_moves(board, player)
+            if not moves and not Board.get_valid_moves(board, Board.opponent(player)):
+                break
+            if moves:
+                board = Board.transform_board(board, rng.choice(moves).coords, player)
+            player = Board.opponent(player)
+        if Board.get_valid_moves(board, player):
+            positions.append((board, player))
+    return positions
+
+def time_per_call(function, positions, repeat):
+    """Returns the average seconds of a call over all positions"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board, player in positions:
+            function(board, player)
+    return (time.perf_counter() - start) / (repeat * len(positions))
+
+def main():
+    print(f'{"size":>6} {"phase":>8} {"moves":>6} {"ray movegen":>14} {"bitboard movegen":>18} {"chosen movegen":>16} {"search d" + str(SEARCH_DEPTH):>12}')
+    for size in SIZES:
+        Board.geometry(size)
+        for phase, fill in PHASES:
+            positions = sample_positions(size, POSITIONS, fill)
+            moves = sum(len(Board.get_valid_moves(board, player)) for board, player in positions) / len(positions)
+            ray_time = time_per_call(Board.get_valid_moves_scan, positions, 10)
+            bitboard_time = time_per_call(Board.get_valid_moves_bitboard, positions, 10)
+            # the engine's own choice between the two, including the cost of choosing
+            chosen_time = time_per_call(Board.get_valid_moves, positions, 10)
+            search_time = time_per_call(lambda board, player: Board.best_move(board, player, SEARCH_DEPTH), positions, 1)
+            print(f'{size:>4}x{size:<2} {phase:>8} {moves:>6.1f} {ray_time * 1e6:>11.1f} us {bitboard_time * 1e6:>15.1f} us '
+                  f'{chosen_time * 1e6:>13.1f} us {search_time * 1e3:>9.1f} ms')
+
+def opening_games(size, openings, opening_plies, game_plies, seed):
+    """Returns positions of games that share seeded openings and then continue at random"""
+    positions = []
+    for opening in range(openings):
+        opening_rng = random.Random(opening)
+        game_rng = random.Random(seed * openings + opening)
+        board = Board.new_board(size)
+        player = 1
+        for ply in range(game_plies):
+            moves = Board.get_valid_moves(board, player)
+            if moves:
+                # after the opening, every other position is searched
+                if ply >= opening_plies and ply % 2 == 0:
+                    positions.append((board, player))
+                rng = opening_rng if ply < opening_plies else game_rng
+                board = Board.transform_board(board, rng.choice(moves).coords, player)
+            player = Board.opponent(player)
+    return positions
+
+def cache_benchmark():
+    """Compares search without the cache, with an empty one and with one warmed by other games"""
+    # the warm-up games and the measured games share their openings but not their later moves
+    warm_positions = opening_games(CACHE_SIZE, CACHE_OPENINGS, CACHE_OPENING_PLIES, CACHE_GAME_PLIES, seed=1)
+    positions = opening_games(CACHE_SIZE, CACHE_OPENINGS, CACHE_OPENING_PLIES, CACHE_GAME_PLIES, seed=2)
+    
+    def search_time(positions, cache):
+        start = time.perf_counter()
+        for board, player in positions:
+            Board.best_move(board, player, CACHE_DEPTH, cache)
+        return time.perf_counter() - start
+    
+    def cached_search(path, warm=False):
+        if warm:
+            cache = SearchCache(path, Board.EVALUATION_VERSION)
+            search_time(warm_positions, cache)
+            cache.close()
+        # a new cache on the same file, like a later app session
+        cache = SearchCache(path, Board.EVALUATION_VERSION)
+        elapsed = search_time(positions, cache)
+        cache.close()
+        return elapsed, cache.stats()
+    
+    def report(name, elapsed, stats=None):
+        line = f'{name:>12} {elapsed:>8.3f} s'
+        if stats:
+            line += (f', hit rate {stats["hit_rate"]:.1%}, saved {stats["saved_seconds"]:.3f} s, '
+                     f'overhead {stats["overhead_seconds"]:.3f} s, net saved {stats["net_saved_seconds"]:.3f} s')
+        print(line)
+    
+    print()
+    print(f'{len(positions)} {CACHE_SIZE}x{CACHE_SIZE} searches at depth {CACHE_DEPTH} from {CACHE_OPENINGS} openings, '
+          f'best of {CACHE_RUNS} runs')
+    report('no cache', min(search_time(positions, None) for _ in range(CACHE_RUNS)))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, warm in (('cold cache', False), ('warm cache', True)):
+            runs = [cached_search(os.path.join(directory, f'{name}_{run}.db'), warm) for run in range(CACHE_RUNS)]
+            report(name, *min(runs, key=lambda run: run[0]))
+
+if __name__ == '__main__':
+    main()
+    cache_benchmark()
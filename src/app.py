@@ -1,21 +1,37 @@
+import logging
 import os
+import sqlite3
 import tkinter as tk
 import time
 from tkinter import ttk
 from PIL import Image, ImageTk
 from threading import Thread
 
+from src.cache import SearchCache
 from src.config import *
 from src.utils import *
 
+logger = logging.getLogger(__name__)
+
 class Othello(tk.Tk):
     def __init__(self, *args, **kwargs):
         tk.Tk.__init__(self, *args, **kwargs)
+        if BOARD_SIZE not in AI_SEARCH_DEPTHS:
+            raise ValueError(f'the app supports board sizes {sorted(AI_SEARCH_DEPTHS)}, got {BOARD_SIZE}')
+        
         self.title('Othello Game')
-        self.geometry('750x750')
+        self.geometry(f'{WINDOW_WIDTH}x{BOARD_SIZE * TILE_PIXELS + WINDOW_MARGIN_HEIGHT}')
         self.resizable(False, False)
         self.iconbitmap('src/assets/images/app.ico')
-        self.protocol('WM_DELETE_WINDOW', lambda: os._exit(0))
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        
+        self.search_cache = None
+        if SEARCH_CACHE_PATH:
+            try:
+                self.search_cache = SearchCache(SEARCH_CACHE_PATH, Board.EVALUATION_VERSION, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MIN_DEPTH)
+            except sqlite3.Error as error:
+                # the game plays the same without the cache, only slower
+                logger.warning('search cache %s could not be opened, playing without it: %s', SEARCH_CACHE_PATH, error)
         
         self.container = tk.Frame(self)
         self.container.pack(side='top', fill='both', expand=True)
@@ -28,6 +44,11 @@ class Othello(tk.Tk):
         frame = page(self.container, self, *args, **kwargs)
         frame.grid(row=0, column=0, sticky='nsew')
         frame.tkraise()
+    
+    def close(self):
+        if self.search_cache:
+            self.search_cache.close()
+        os._exit(0)
 
 class OthelloPage(tk.Frame):
     def __init__(self, parent, controller, *args, **kwargs):
@@ -36,7 +57,8 @@ class OthelloPage(tk.Frame):
         self.controller = controller
         
         self.tile_images = [ImageTk.PhotoImage(Image.open(f'src/assets/images/tile_{n}.png')) for n in range(7)]
-        self.board = [x[:] for x in [[None] * 8] * 8]
+        self.board_size = BOARD_SIZE
+        self.board = [[None] * self.board_size for _ in range(self.board_size)]
         self.current_board_state = []
 
         self.is_moving = False
@@ -111,14 +133,14 @@ class OthelloPage(tk.Frame):
             '''
     
     def initialize_board(self):
-         for i in range(8):
-            for j in range(8):
+         for i in range(self.board_size):
+            for j in range(self.board_size):
                 self.board[i][j] = tk.Button(self.frame_board, **TILE_BUTTON_PROPERTIES)
                 self.board[i][j].grid(row=i, column=j, padx=2, pady=2)
     
     def populate_board(self, state):
-        for i in range(8):
-            for j in range(8):
+        for i in range(self.board_size):
+            for j in range(self.board_size):
                 self.board[i][j].configure(
                     text=state[i][j],
                     image=self.tile_images[int(state[i][j])],
@@ -135,16 +157,7 @@ class OthelloPage(tk.Frame):
     def reset_board(self):
         self.stop()
         if not self.is_moving:
-            state =  [
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 2, 1, 0, 0, 0],
-                [0, 0, 0, 1, 2, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0],
-            ]
+            state = Board.new_board(self.board_size)
             
             '''
             # no move state
@@ -209,7 +222,9 @@ class OthelloPage(tk.Frame):
     def move_AI(self, player):
         self.is_moving = True
         
-        move = Board.best_move(self.current_board_state, player, 5).coords
+        move = Board.best_move(self.current_board_state, player, AI_SEARCH_DEPTHS[self.board_size], self.controller.search_cache).coords
+        if self.controller.search_cache:
+            self.controller.search_cache.flush_async()
         state =  Board.transform_board(self.current_board_state, move, player)
         time.sleep(0.5)
         self.update_board(state)
@@ -266,7 +281,7 @@ class OthelloPage(tk.Frame):
         p1_has_no_move = Board.has_no_move(self.current_board_state, 1)
         p2_has_no_move = Board.has_no_move(self.current_board_state, 2)
         
-        if (self.P1_score + self.P2_score == 64) or (p1_has_no_move and p2_has_no_move):
+        if (self.P1_score + self.P2_score == self.board_size ** 2) or (p1_has_no_move and p2_has_no_move):
             if self.P1_score < self.P2_score:
                 self.update_status('P2 wins')
             elif self.P1_score > self.P2_score:
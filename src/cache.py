@@ -0,0 +1,305 @@
+import logging
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from itertools import chain
+from threading import Event, Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+class CacheEntry:
+    def __init__(self, depth, bound, score, move, cost):
+        self.depth = depth
+        self.bound = bound
+        self.score = score
+        self.move = move
+        self.cost = cost
+    
+    def __repr__(self):
+        return f'CacheEntry(depth={self.depth}, bound={self.bound}, score={self.score}, move={self.move}, cost={self.cost:.6f})'
+
+class SearchCache:
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+    
+    # the disk is only trimmed once it holds this share more entries than the limit
+    EVICTION_SLACK = 0.1
+    
+    _zobrist_keys = {}
+    
+    def __init__(self, path, version, max_entries=200000, min_depth=2, read_depth=4, flush_interval=2.0, depth_bonus=3600.0):
+        """Opens a search cache stored in a SQLite file shared by every app session"""
+        self.path = path
+        # version of the evaluation the cached scores come from
+        self.version = version
+        self.max_entries = max_entries
+        # only results searched at least this deep are cached
+        self.min_depth = min_depth
+        # only results searched at least this deep are read from disk, which keeps the
+        # reads near the root of the search where a hit skips the most work
+        self.read_depth = read_depth
+        self.flush_interval = flush_interval
+        # seconds of recency each ply of depth is worth when choosing what to evict
+        self.depth_bonus = depth_bonus
+        
+        self.memory = OrderedDict()
+        self.pending = {}
+        self.touched = set()
+        self.lock = Lock()
+        self.disk_lock = Lock()
+        
+        self.lookups = 0
+        self.hits = 0
+        self.disk_reads = 0
+        self.disk_hits = 0
+        self.saved_seconds = 0.0
+        self.overhead_seconds = 0.0
+        
+        self.reader = self.connect()
+        try:
+            with self.reader:
+                self.reader.execute('''
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key INTEGER PRIMARY KEY,
+                        depth INTEGER NOT NULL,
+                        bound INTEGER NOT NULL,
+                        score INTEGER NOT NULL,
+                        move INTEGER,
+                        cost REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                ''')
+                # scores from another evaluation would be served as if they were current
+                file_version = self.reader.execute('PRAGMA user_version').fetchone()[0]
+                if file_version != version:
+                    # a new file has version 0 and nothing to clear
+                    if file_version:
+                        logger.info('search cache %s is from evaluation %s, clearing it', path, file_version)
+                    self.reader.execute('DELETE FROM entries')
+                    self.reader.execute(f'PRAGMA user_version = {int(version)}')
+        except sqlite3.Error:
+            self.reader.close()
+            raise
+        
+        self.closed = False
+        self.flush_event = Event()
+        self.writer_thread = Thread(target=self.write_loop, daemon=True)
+        self.writer_thread.start()
+    
+    def connect(self):
+        """Returns a connection that waits on other processes instead of failing"""
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        try:
+            # write-ahead logging lets readers in other processes run alongside a writer
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+    
+    @staticmethod
+    def zobrist_keys(size):
+        """Returns the random keys of each square and disc, the same in every process"""
+        if size not in SearchCache._zobrist_keys:
+            rng = random.Random(size)
+            # SQLite integers are signed, so keys stay within 63 bits
+            squares = [(0, rng.getrandbits(63), rng.getrandbits(63)) for _ in range(size * size)]
+            SearchCache._zobrist_keys[size] = (squares, rng.getrandbits(63))
+        return SearchCache._zobrist_keys[size]
+    
+    def position_key(self, board, player):
+        """Returns the Zobrist hash of a position and the player to move"""
+        start = time.perf_counter()
+        squares, second_player = SearchCache.zobrist_keys(len(board))
+        key = second_player if player == 2 else 0
+        for cell, keys in zip(chain.from_iterable(board), squares):
+            if cell:
+                key ^= keys[cell]
+        self.overhead_seconds += time.perf_counter() - start
+        return key
+    
+    def lookup(self, key, depth, size):
+        """Returns the cached result of a position searched at least as deep, or None"""
+        start = time.perf_counter()
+        with self.lock:
+            self.lookups += 1
+            entry = self.memory.get(key)
+            if entry is not None and entry.depth >= depth:
+                self.memory.move_to_end(key)
+                self.touched.add(key)
+                self.overhead_seconds += time.perf_counter() - start
+                return entry
+        
+        entry = None
+        if depth >= self.read_depth:
+            try:
+                with self.disk_lock:
+                    row = self.reader.execute(
+                        'SELECT depth, bound, score, move, cost FROM entries WHERE key = ? AND depth >= ?',
+                        (key, depth)
+                    ).fetchone()
+            except sqlite3.Error as error:
+                # the cache is optional, so a failed read only costs the search a miss
+                logger.warning('search cache could not read from %s: %s', self.path, error)
+                row = None
+            with self.lock:
+                self.disk_reads += 1
+                if row is not None:
+                    disk_depth, bound, score, move, cost = row
+                    if move is not None:
+                        move = divmod(move, size)
+                    entry = CacheEntry(disk_depth, bound, score, move, cost)
+                    self.remember(key, entry)
+                    self.touched.add(key)
+                    self.disk_hits += 1
+        self.overhead_seconds += time.perf_counter() - start
+        return entry
+    
+    def record_hit(self, entry):
+        """Counts a search answered from an entry, saving the time it first took"""
+        with self.lock:
+            self.hits += 1
+            self.saved_seconds += entry.cost
+    
+    def store(self, key, size, depth, bound, score, move, cost):
+        """Records a search result, keeping the deeper one when a position is already cached"""
+        start = time.perf_counter()
+        entry = CacheEntry(depth, bound, score, move, cost)
+        with self.lock:
+            current = self.memory.get(key)
+            if current is None or current.depth <= depth:
+                self.remember(key, entry)
+                self.pending[key] = (entry, size)
+        self.overhead_seconds += time.perf_counter() - start
+    
+    def remember(self, key, entry):
+        """Puts an entry in memory, dropping the least recently used beyond the limit"""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+    
+    def flush_async(self):
+        """Asks the writer thread to flush without waiting for it"""
+        self.flush_event.set()
+    
+    def write_loop(self):
+        writer = None
+        disk_entries = None
+        while True:
+            # a close asked for during this write still gets one more write after it
+            closing = self.closed
+            try:
+                if writer is None:
+                    writer = self.connect()
+                if disk_entries is None:
+                    disk_entries = writer.execute('SELECT count(*) FROM entries').fetchone()[0]
+                disk_entries = self.write_pending(writer, disk_entries)
+            except sqlite3.Error as error:
+                # keep what was not written and try again on the next flush
+                logger.warning('search cache could not write to %s: %s', self.path, error)
+                if writer is not None:
+                    writer.close()
+                    writer = None
+            if closing:
+                break
+            self.flush_event.wait(self.flush_interval)
+            self.flush_event.clear()
+        if writer is not None:
+            writer.close()
+    
+    def write_pending(self, connection, disk_entries):
+        """Writes pending results to disk and returns about how many entries it holds"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            touched, self.touched = self.touched, set()
+        if not pending and not touched:
+            return disk_entries
+        
+        now = time.time()
+        rows = []
+        for key, (entry, size) in pending.items():
+            move = None if entry.move is None else entry.move[0] * size + entry.move[1]
+            rows.append((key, entry.depth, entry.bound, entry.score, move, entry.cost, now))
+        
+        try:
+            with connection:
+                # another process may have stored the position deeper meanwhile
+                connection.executemany('''
+                    INSERT INTO entries (key, depth, bound, score, move, cost, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        depth = excluded.depth,
+                        bound = excluded.bound,
+                        score = excluded.score,
+                        move = excluded.move,
+                        cost = excluded.cost,
+                        last_used = excluded.last_used
+                    WHERE excluded.depth >= entries.depth
+                ''', rows)
+                connection.executemany(
+                    'UPDATE entries SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in touched - pending.keys()]
+                )
+                # counts updates as new entries too, so the real count is at most this
+                disk_entries += len(rows)
+                if disk_entries > self.max_entries * (1 + SearchCache.EVICTION_SLACK):
+                    disk_entries = self.evict(connection)
+        except sqlite3.Error:
+            self.requeue(pending, touched)
+            raise
+        return disk_entries
+    
+    def evict(self, connection):
+        """Deletes the least recently used entries beyond the limit, keeping deeper ones longer"""
+        disk_entries = connection.execute('SELECT count(*) FROM entries').fetchone()[0]
+        if disk_entries > self.max_entries:
+            connection.execute('''
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries
+                    ORDER BY last_used + depth * ? ASC
+                    LIMIT ?
+                )
+            ''', (self.depth_bonus, disk_entries - self.max_entries))
+            disk_entries = self.max_entries
+        return disk_entries
+    
+    def requeue(self, pending, touched):
+        """Puts back results that failed to write, dropping the oldest beyond the limit"""
+        with self.lock:
+            # results stored since the failed write are newer, so they win
+            pending.update(self.pending)
+            self.pending = pending
+            self.touched |= touched
+            for key in list(self.pending)[:max(0, len(self.pending) - self.max_entries)]:
+                del self.pending[key]
+            while len(self.touched) > self.max_entries:
+                self.touched.pop()
+    
+    def close(self):
+        """Stops the writer thread once it has written what is left"""
+        if self.closed:
+            return
+        self.closed = True
+        self.flush_event.set()
+        self.writer_thread.join()
+        with self.disk_lock:
+            self.reader.close()
+    
+    def stats(self):
+        """Returns the hit rate and search time saved by the cache, net of its own overhead"""
+        with self.lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'disk_reads': self.disk_reads,
+                'disk_hits': self.disk_hits,
+                'saved_seconds': self.saved_seconds,
+                'overhead_seconds': self.overhead_seconds,
+                'net_saved_seconds': self.saved_seconds - self.overhead_seconds,
+                'memory_entries': len(self.memory),
+            }
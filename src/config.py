@@ -1,3 +1,26 @@
+# board
+
+BOARD_SIZE = 8
+
+# board sizes the app window can fit, with the depth the computer searches on each
+AI_SEARCH_DEPTHS = {
+    6: 5,
+    8: 5,
+    10: 4,
+}
+
+# pixels a tile takes on screen (40px image and 2px padding on each side), and the
+# height the title, scores and buttons take above and below the board
+TILE_PIXELS = 44
+WINDOW_WIDTH = 750
+WINDOW_MARGIN_HEIGHT = 398
+
+# search cache, shared on disk across app sessions (set the path to None to disable)
+
+SEARCH_CACHE_PATH = 'search_cache.db'
+SEARCH_CACHE_MAX_ENTRIES = 200000
+SEARCH_CACHE_MIN_DEPTH = 2
+
 # colors
 
 BLACK = '#23272a'
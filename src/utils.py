@@ -1,3 +1,7 @@
+import time
+
+from src.cache import SearchCache
+
 class Move:
     def __init__(self, coords, points):
         self.coords = coords
@@ -6,21 +10,102 @@ class Move:
     def __repr__(self):
         return f'Move(coords={self.coords}, points={self.points})'
 
+class Geometry:
+    """Precomputed tables of a board size, shared by every board of that size"""
+    DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+    
+    def __init__(self, size):
+        self.size = size
+        self.squares = size * size
+        self.full = (1 << self.squares) - 1
+        self.weights = Geometry.generate_weights(size)
+        
+        # rays[row][col] lists, per direction, the coordinates walked from that cell to the edge
+        self.rays = [[[] for col in range(size)] for row in range(size)]
+        for row in range(size):
+            for col in range(size):
+                for vert, horz in Geometry.DIRECTIONS:
+                    ray = []
+                    lrow, lcol = row + vert, col + horz
+                    while 0 <= lrow < size and 0 <= lcol < size:
+                        ray.append((lrow, lcol))
+                        lrow += vert
+                        lcol += horz
+                    # a ray needs an opponent disc and a closing disc to flip anything
+                    if len(ray) >= 2:
+                        self.rays[row][col].append(ray)
+        
+        # bitboard shifts as (left, right, mask), masked so discs cannot wrap around to the other side
+        not_first_col = 0
+        not_last_col = 0
+        for row in range(size):
+            for col in range(size):
+                if col != 0:
+                    not_first_col |= 1 << (row * size + col)
+                if col != size - 1:
+                    not_last_col |= 1 << (row * size + col)
+        self.shifts = []
+        for vert, horz in Geometry.DIRECTIONS:
+            if horz == 1:
+                mask = not_first_col
+            elif horz == -1:
+                mask = not_last_col
+            else:
+                mask = self.full
+            shift = vert * size + horz
+            self.shifts.append((max(shift, 0), max(-shift, 0), mask))
+    
+    @staticmethod
+    def generate_weights(size):
+        """Returns a board of weights, where corners and most edges are important"""
+        # top-left quarter of the classic 8x8 weights, mirrored to the other corners
+        pattern = [
+            [100, -10,  10,   3],
+            [-10, -20,  -3,  -3],
+            [ 10,  -3,   8,   1],
+            [  3,  -3,   1,   1],
+        ]
+        # squares at or past the inner ring of the pattern count as interior
+        interior = min(3, size // 2 - 1)
+        
+        def ring(index):
+            depth = min(index, size - 1 - index)
+            return 3 if depth >= interior else depth
+        
+        return [[pattern[ring(row)][ring(col)] for col in range(size)] for row in range(size)]
+
 class Board:
     MAX_SCORE = 100
     MIN_SCORE = -MAX_SCORE
-
-    # board of weight of each position, where corners and most edges are important
-    BOARD_WEIGHTS = [
-        [100, -10,  10,   3,   3,  10, -10, 100],
-        [-10, -20,  -3,  -3,  -3,  -3, -20, -10],
-        [ 10,  -3,   8,   1,   1,   8,  -3,  10],
-        [  3,  -3,   1,   1,   1,   1,  -3,   3],
-        [  3,  -3,   1,   1,   1,   1,  -3,   3],
-        [ 10,  -3,   8,   1,   1,   8,  -3,  10],
-        [-10, -20,  -3,  -3,  -3,  -3, -20, -10],
-        [100, -10,  10,   3,   3,  10, -10, 100],
-    ]
+    
+    # bump whenever the scores change (weights, MAX_SCORE, final_value), so search
+    # results cached on disk by an older evaluation are thrown away
+    EVALUATION_VERSION = 1
+    
+    # positions with at least half the board empty generate moves with big-int bitboards,
+    # once fewer squares are empty scanning them is faster (see benchmark.py)
+    
+    _geometries = {}
+    
+    @staticmethod
+    def geometry(size):
+        """Returns the precomputed tables of a board size"""
+        if size not in Board._geometries:
+            Board._geometries[size] = Geometry(size)
+        return Board._geometries[size]
+    
+    @staticmethod
+    def new_board(size=8):
+        """Returns the starting board of a size"""
+        if size < 4 or size % 2 != 0:
+            raise ValueError(f'board size must be an even number of at least 4, got {size}')
+        board = [[0] * size for _ in range(size)]
+        mid = size // 2
+        board[mid - 1][mid - 1] = 2
+        board[mid - 1][mid] = 1
+        board[mid][mid - 1] = 1
+        board[mid][mid] = 2
+        return board
     
     @staticmethod
     def copy_board(board):
@@ -31,24 +116,23 @@ class Board:
     def player_scores(board, P1, P2):
         "Returns the scores of the two players"
         P1_score, P2_score = 0, 0
-        for row in range(8):
-            for col in range(8):
-                if board[row][col] == P1:
-                    P1_score += 1
-                elif board[row][col] == P2:
-                    P2_score += 1
+        for row in board:
+            P1_score += row.count(P1)
+            P2_score += row.count(P2)
         return P1_score, P2_score
     
     @staticmethod
     def heuristic_value(board, player):
         """Returns the heuristic value of a player"""
+        weights = Board.geometry(len(board)).weights
+        opponent = Board.opponent(player)
         score = 0
-        for row in range(8):
-            for col in range(8):
-                if board[row][col] == player:
-                    score += Board.BOARD_WEIGHTS[row][col]
-                elif board[row][col] == Board.opponent(player):
-                    score -= Board.BOARD_WEIGHTS[row][col]
+        for row, weight_row in zip(board, weights):
+            for cell, weight in zip(row, weight_row):
+                if cell == player:
+                    score += weight
+                elif cell == opponent:
+                    score -= weight
         return score
     
     @staticmethod
@@ -61,50 +145,38 @@ class Board:
             return Board.MAX_SCORE
         return score
     
-    @staticmethod
-    def in_bound(row, col):
-        """Checks if a coordinate is within the board or not"""
-        return 0 <= row < 8 and 0 <= col < 8
-    
-    @staticmethod
-    def count_points(board, row, col, horz, vert):
-        """Returns the points"""
-        player = board[row][col]
-        points = 1
-        for scalar in range(1, 8 + 1):
-            if Board.in_bound(row + scalar * horz, col + scalar * vert):
-                if board[row + scalar * horz][col + scalar * vert] == 0:
-                    return 0
-                elif board[row + scalar * horz][col + scalar * vert] == player:
-                    points += 1
-                else:
-                    return points
-            else:
-                return 0
-        return points
-    
     @staticmethod
     def check_move(board, row, col, player):
-        """Returns the points of a player move"""
+        """Returns the points of a player move, the number of discs it flips"""
         points = 0
-        directions = [-1, 0, 1]
-        for horz in directions:
-            for vert in directions:
-                if vert != 0 or horz != 0:
-                    if Board.in_bound(row + horz, col + vert):
-                        examined = board[row + horz][col + vert]
-                        if examined != 0 and examined != player:
-                            points += Board.count_points(board, row + horz, col + vert, horz, vert)
-                        if points > 0:
-                            return points
+        for ray in Board.geometry(len(board)).rays[row][col]:
+            discs = 0
+            for lrow, lcol in ray:
+                examined = board[lrow][lcol]
+                if examined == 0:
+                    break
+                elif examined != player:
+                    discs += 1
+                else:
+                    points += discs
+                    break
         return points
     
     @staticmethod
     def get_valid_moves(board, player):
         """Returns all valid moves of a player"""
+        size = len(board)
+        if sum(row.count(0) for row in board) * 2 >= size * size:
+            return Board.get_valid_moves_bitboard(board, player)
+        return Board.get_valid_moves_scan(board, player)
+    
+    @staticmethod
+    def get_valid_moves_scan(board, player):
+        """Returns all valid moves of a player by checking every empty square"""
+        size = len(board)
         valid_moves = []
-        for row in range(8):
-            for col in range(8):
+        for row in range(size):
+            for col in range(size):
                 if board[row][col] == 0:
                     points = Board.check_move(board, row, col, player)
                     if points > 0:
@@ -114,6 +186,53 @@ class Board:
         else:
             return valid_moves
     
+    @staticmethod
+    def to_bitboards(board, player):
+        """Returns the discs of a player and of the opponent as integer bitboards"""
+        own, opp = 0, 0
+        opponent = Board.opponent(player)
+        bit = 1
+        for row in board:
+            for cell in row:
+                if cell == player:
+                    own |= bit
+                elif cell == opponent:
+                    opp |= bit
+                bit <<= 1
+        return own, opp
+    
+    @staticmethod
+    def move_bits(own, opp, geometry):
+        """Returns the bitboard of every square where the player can move"""
+        empty = ~(own | opp) & geometry.full
+        moves = 0
+        # shifts are written out inline, as this runs at every node of the search
+        for left, right, mask in geometry.shifts:
+            # grow a line of opponent discs out of each own disc, then step onto an empty square
+            line = ((own << left) >> right) & mask & opp
+            for _ in range(geometry.size - 3):
+                line |= ((line << left) >> right) & mask & opp
+            moves |= ((line << left) >> right) & mask & empty
+        return moves
+    
+    @staticmethod
+    def get_valid_moves_bitboard(board, player):
+        """Returns all valid moves of a player using bitboard move generation"""
+        geometry = Board.geometry(len(board))
+        own, opp = Board.to_bitboards(board, player)
+        moves = Board.move_bits(own, opp, geometry)
+        
+        valid_moves = []
+        while moves:
+            move = moves & -moves
+            row, col = divmod(move.bit_length() - 1, geometry.size)
+            valid_moves.append(Move((row, col), Board.check_move(board, row, col, player)))
+            moves ^= move
+        if not valid_moves:
+            return None
+        else:
+            return valid_moves
+    
     @staticmethod
     def transform_board(board, move, player):
         """Returns a new instance of the board when a move is applied"""
@@ -124,34 +243,21 @@ class Board:
         new_board = Board.copy_board(board)
         new_board[row][col] = player
         
-        directions = [-1, 0, 1]
-        # this combination checks surrounding cells
-        for vert in directions:
-            for horz in directions:
-                discs = []
-                if vert == horz == 0:
-                    continue
-                
-                lrow = row
-                lcol = col
-                lrow += vert
-                lcol += horz
-                
-                while Board.in_bound(lrow, lcol):
-                    # if opponent's disc, append to flip later
-                    if new_board[lrow][lcol] != player and new_board[lrow][lcol] != 0:
-                        discs.append((lrow, lcol))
-                    # space breaks direct line, no disc flipped
-                    elif new_board[lrow][lcol] == 0:
-                        break
-                    # if same player disc found, flip all discs in between
-                    elif new_board[lrow][lcol] == player:
-                        for a, b in discs:
-                            new_board[a][b] = player
-                        break
-                    
-                    lrow += vert
-                    lcol += horz
+        # walk each precomputed ray from the move outwards
+        for ray in Board.geometry(len(board)).rays[row][col]:
+            discs = []
+            for lrow, lcol in ray:
+                # if opponent's disc, append to flip later
+                if new_board[lrow][lcol] != player and new_board[lrow][lcol] != 0:
+                    discs.append((lrow, lcol))
+                # space breaks direct line, no disc flipped
+                elif new_board[lrow][lcol] == 0:
+                    break
+                # if same player disc found, flip all discs in between
+                elif new_board[lrow][lcol] == player:
+                    for a, b in discs:
+                        new_board[a][b] = player
+                    break
         
         return new_board
     
@@ -177,14 +283,14 @@ class Board:
             return 0
     
     @staticmethod
-    def best_move(board, player, depth=1):
+    def best_move(board, player, depth=1, cache=None):
         """Returns the best move using search algorithm"""
         if Board.has_no_move(board, player):
             return None
         
         # best_move = Board.minimax_search(board, player, depth)
         # best_move = Board.negamax_search(board, player, depth)
-        best_move = Board.alphabeta_search(board, player, Board.MIN_SCORE, Board.MAX_SCORE, depth)
+        best_move = Board.alphabeta_search(board, player, Board.MIN_SCORE, Board.MAX_SCORE, depth, cache)
         
         return best_move
     
@@ -264,36 +370,70 @@ class Board:
         return best_move
     
     @staticmethod
-    def alphabeta_search(board, player, alpha, beta, depth):
+    def alphabeta_search(board, player, alpha, beta, depth, cache=None):
         """Returns the best move using alpha-beta search"""
         if depth == 0:
             return Move(None, Board.heuristic_value(board, player))
         
+        # nodes this shallow are cheaper to search again than to look up
+        if cache is not None and depth < cache.min_depth:
+            cache = None
+        
+        if cache is not None:
+            key = cache.position_key(board, player)
+            # a result searched at least this deep can answer or narrow the window
+            entry = cache.lookup(key, depth, len(board))
+            if entry is not None:
+                if entry.bound == SearchCache.EXACT:
+                    cache.record_hit(entry)
+                    return Move(entry.move, entry.score)
+                elif entry.bound == SearchCache.LOWER:
+                    alpha = max(alpha, entry.score)
+                elif entry.bound == SearchCache.UPPER:
+                    beta = min(beta, entry.score)
+                if beta <= alpha:
+                    cache.record_hit(entry)
+                    return Move(entry.move, entry.score)
+            start = time.perf_counter()
+        original_alpha = alpha
+        
         valid_moves = Board.get_valid_moves(board, player)
         
         if not valid_moves:
             # if player has no more valid moves, evaluate the opponent's next play
             if not Board.get_valid_moves(board, Board.opponent(player)):
                 # if no more moves for both players, return the final move
-                return Move(None, Board.final_value(board, player))
+                best_move = Move(None, Board.final_value(board, player))
+                if cache is not None:
+                    cache.store(key, len(board), depth, SearchCache.EXACT, best_move.points, None, time.perf_counter() - start)
+                return best_move
             # if opponent has valid moves, return points for that move
-            value = -Board.alphabeta_search(board, Board.opponent(player), -beta, -alpha, depth - 1).points 
-            return Move(None, value)
-        
-        best_move = valid_moves[0]
-        best_move.points = alpha
+            value = -Board.alphabeta_search(board, Board.opponent(player), -beta, -alpha, depth - 1, cache).points 
+            best_move = Move(None, value)
+        else:
+            best_move = valid_moves[0]
+            best_move.points = alpha
+            
+            for move in valid_moves:
+                if beta <= alpha:
+                    # prune nodes that are not worth visiting
+                    break
+                move_board = Board.transform_board(board, move.coords, player)
+                value = -Board.alphabeta_search(move_board, Board.opponent(player), -beta, -alpha, depth - 1, cache).points 
+                if value > alpha:
+                    # new max
+                    alpha = value
+                    best_move = move
+                    best_move.points = alpha
         
-        for move in valid_moves:
-            if beta <= alpha:
-                # prune nodes that are not worth visiting
-                break
-            move_board = Board.transform_board(board, move.coords, player)
-            value = -Board.alphabeta_search(move_board, Board.opponent(player), -beta, -alpha, depth - 1).points 
-            if value > alpha:
-                # new max
-                alpha = value
-                best_move = move
-                best_move.points = alpha
+        if cache is not None:
+            if best_move.points <= original_alpha:
+                bound = SearchCache.UPPER
+            elif best_move.points >= beta:
+                bound = SearchCache.LOWER
+            else:
+                bound = SearchCache.EXACT
+            cache.store(key, len(board), depth, bound, best_move.points, best_move.coords, time.perf_counter() - start)
         
         return best_move
 